@@ -1,8 +1,13 @@
-from collections import Counter, namedtuple
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import heapq
 from math import ceil
 from operator import itemgetter
+import os
 import random
 
+import numpy
+
 from painting import Painting
 from weighted_random import WeightedRandomColors
 
@@ -11,12 +16,43 @@ ScoredPainting = namedtuple('ScoredPainting', ['score', 'painting', 'gen_id'])
 
 # Constants
 SPAN, RANDOM, SURVIVORS = 'span', 'random', 'survivors'
+SORT, TOURNAMENT = 'sort', 'tournament'
 
 
 class GeneticsError(Exception):
     pass
 
 
+# Worker-process state for parallel scoring, set up by _init_score_worker
+# so each task only has to ship a (gen_id, painting) pair.
+_worker_state = {}
+
+
+def _init_score_worker(score_func, world):
+    _worker_state['score_func'] = score_func
+    _worker_state['world'] = world
+
+
+def _score_worker(task):
+    gen_id, painting = task
+    return _worker_state['score_func'](
+        _worker_state['world'], gen_id, painting
+    )
+
+
+def _init_generate_worker(world):
+    _worker_state['world'] = world
+
+
+def _generate_worker(seed_seq):
+    # Reseed both RNGs from the spawned SeedSequence so forked workers
+    # don't all paint the same paintings.
+    seeds = seed_seq.generate_state(2)
+    random.seed(int(seeds[0]))
+    numpy.random.seed(int(seeds[1]))
+    return _worker_state['world']._generate_painting()
+
+
 class BreedError(GeneticsError):
     pass
 
@@ -33,11 +69,13 @@ class GeneticPainting(object):
         mutation_chance: the chance an organism has to mutate.
         fit_percentage: percentage of top paintings to "naturally" select
         lucky_percentage: percentage of non-top paintings that get lucky
+        max_workers: how many processes to score paintings with. Use 1
+            to score in-process; None uses every core. Default is None.
     '''
 
     def __init__(
         self, ref, image, num_strokes, pop_size, mutation_chance,
-        fit_percentage, lucky_percentage
+        fit_percentage, lucky_percentage, max_workers=None
     ):
         self.ref = ref
         self.image = image
@@ -46,29 +84,43 @@ class GeneticPainting(object):
         self.mutation_chance = mutation_chance
         self.fit_percentage = fit_percentage
         self.lucky_few = int(ceil(pop_size * lucky_percentage))
+        self.max_workers = max_workers
 
         self.generation = 0
+        self._score_cache = {}
+        self._last_best = None
         self.num_children = int(
             pop_size // (pop_size * fit_percentage + self.lucky_few)
         )
 
-        # Calculate some color weights for smarter randomization
-        image_data = list(image.getdata())
-        color_weights = [
-            (color, count)
-            for color, count in Counter(image_data).items()
-            if count > 1
-        ]
-        color_weights = sorted(color_weights, key=itemgetter(1))
+        # Calculate some color weights for smarter randomization. Work
+        # in a quantized palette of up to 256 colors: strokes then
+        # carry one uint8 palette index apiece instead of three
+        # channels, and counting is a single bincount.
+        palette_img = image.convert('RGB').quantize(colors=256)
+        self.palette = numpy.asarray(
+            palette_img.getpalette(), dtype=numpy.uint8
+        ).reshape(-1, 3)[:256]
+        counts = numpy.bincount(
+            numpy.asarray(palette_img).ravel(), minlength=256
+        )
+
+        repeated = counts > 1
+        indices = numpy.arange(256)[repeated]
+        counts = counts[repeated]
 
-        self.canvas = color_weights[-1][0]  # use most common color
-        self.weights = WeightedRandomColors(color_weights)
+        # use most common color for the canvas
+        self.canvas = tuple(
+            self.palette[indices[numpy.argmax(counts)]].tolist()
+        )
+        self.weights = WeightedRandomColors(list(zip(indices, counts)))
 
         self.population = self.create_population()
 
     def _generate_painting(self):
         return Painting.generate(
             self.ref, self.image, self.weights, self.canvas, self.num_strokes,
+            self.palette,
         )
 
     def create_population(self):
@@ -78,10 +130,24 @@ class GeneticPainting(object):
         Returns:
             a copy of the list of Paintings generated for this world.
         '''
-        self.population = [
-            self._generate_painting()
-            for i in range(self.pop_size)
-        ]
+        # Small populations aren't worth the pool spin-up cost.
+        if self.max_workers == 1 or self.pop_size <= 64:
+            self.population = [
+                self._generate_painting()
+                for i in range(self.pop_size)
+            ]
+        else:
+            seeds = numpy.random.SeedSequence().spawn(self.pop_size)
+            workers = self.max_workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_generate_worker,
+                initargs=(self,),
+            ) as executor:
+                self.population = list(executor.map(
+                    _generate_worker, seeds,
+                    chunksize=max(1, self.pop_size // (workers * 4)),
+                ))
 
         return list(self.population)
 
@@ -100,14 +166,72 @@ class GeneticPainting(object):
         Returns:
             an array of namedtuples like (score, painting)
         '''
-        scored = list()
+        scored = [None] * len(self.population)
+        tasks = []
+        next_cache = {}
+        best = None
         for i, painting in enumerate(self.population):
-            score = score_func(self, i + 1, painting)
-            scored.append(ScoredPainting(score, painting, i + 1))
+            # Survivors carry their strokes unchanged between
+            # generations, so reuse their scores from last time.
+            cached = self._score_cache.get(hash(painting))
+            if cached is not None:
+                entry = ScoredPainting(cached, painting, i + 1)
+                scored[i] = entry
+                next_cache[hash(painting)] = cached
+                if best is None or entry.score > best.score:
+                    best = entry
+            else:
+                tasks.append((i + 1, painting))
+
+        if self.max_workers == 1:
+            scores = [
+                score_func(self, gen_id, painting)
+                for gen_id, painting in tasks
+            ]
+        elif tasks:
+            with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_score_worker,
+                initargs=(score_func, self),
+            ) as executor:
+                scores = list(executor.map(_score_worker, tasks))
+        else:
+            scores = []
+
+        for (gen_id, painting), score in zip(tasks, scores):
+            entry = ScoredPainting(score, painting, gen_id)
+            scored[gen_id - 1] = entry
+            next_cache[hash(painting)] = score
+            if best is None or entry.score > best.score:
+                best = entry
+
+        # Only keep scores for paintings that are still in the herd.
+        self._score_cache = next_cache
+        self._last_best = best
 
         return scored
 
-    def cull_the_herd(self, scored_generation, strategy=SURVIVORS):
+    def score_and_best(self, score_func):
+        '''
+        Scores the current population and picks out the best painting
+        in the same pass: score_population tracks the leader while it
+        assembles the scored list, so nothing walks it a second time.
+
+        Args:
+            score_func: a scoring function, as for score_population.
+
+        Returns:
+            a tuple of (scored, best), where scored is the array of
+            ScoredPainting namedtuples and best is the highest-scoring
+            one among them.
+        '''
+        scored = self.score_population(score_func)
+        return scored, self._last_best
+
+    def cull_the_herd(
+        self, scored_generation, strategy=SURVIVORS, selection=SORT,
+        tournament_size=3,
+    ):
         '''
         Performs the selection on the supplied, scored generation.
 
@@ -118,16 +242,40 @@ class GeneticPainting(object):
                 choose from the survivors not already chosen by score,
                 while RANDOM will generate new, random Paintings to
                 intermingle with the winners. Default is SURVIVORS.
+            selection: either genetics.SORT, which keeps exactly the
+                top scorers, or genetics.TOURNAMENT, which runs a
+                series of small tournaments instead of sorting the
+                whole population. TOURNAMENT softens the selection
+                pressure and skips the O(N log N) sort; it picks its
+                own lucky few, so strategy is ignored. Default is SORT.
+            tournament_size: how many paintings face off per
+                TOURNAMENT round. Default is 3.
 
         Returns:
             the survivors of this generation, an array of paintings.
         '''
         winners = int(self.pop_size * self.fit_percentage)
-        sorted_pop = sorted(scored_generation, key=itemgetter(0))
 
-        survivors = sorted_pop[-winners:]
+        if selection == TOURNAMENT:
+            chosen = [
+                max(
+                    random.sample(scored_generation, tournament_size),
+                    key=itemgetter(0),
+                )
+                for _ in range(winners + self.lucky_few)
+            ]
+            return [painting for score, painting, gen_id in chosen]
+
+        # Partial sorts: only the best and worst `winners` entries
+        # matter, so skip ordering the whole population.
+        survivors = heapq.nlargest(
+            winners, scored_generation, key=itemgetter(0)
+        )
         if strategy == SURVIVORS:
-            additions = random.sample(sorted_pop[:winners], self.lucky_few)
+            additions = random.sample(
+                heapq.nsmallest(winners, scored_generation, key=itemgetter(0)),
+                self.lucky_few,
+            )
         elif strategy == RANDOM:
             additions = [
                 ScoredPainting(0, self._generate_painting(), 0)
@@ -145,15 +293,23 @@ class GeneticPainting(object):
         '''
         for painting in self.population:
             if random.random() < self.mutation_chance:
-                random.shuffle(painting.strokes)
+                painting.shuffle_strokes()
+
+    @staticmethod
+    def _random_pairs(count, num_breeders):
+        '''Pair off distinct random parent indexes, vectorized.'''
+        parents1 = numpy.random.randint(0, num_breeders, count)
+        offsets = numpy.random.randint(1, num_breeders, count)
+        return parents1, (parents1 + offsets) % num_breeders
 
     def breed(self, breeders, strategy=SPAN):
         '''
         Breeds the given generation, producing a new one!
 
         Args:
-            breeders: an array of paintings to breed. The class of these
-                paintings must have __mult__ defined.
+            breeders: an array of Paintings of the same reference, to
+                breed. The breeders themselves carry over into the new
+                generation, so their cached scores stay warm.
             strategy: one of genetics.RANDOM or genetics.SPAN. If RANDOM,
                 the paintings will be paired off entirely randomly. If
                 SPAN, the paintings will be paired off such that every
@@ -162,28 +318,33 @@ class GeneticPainting(object):
         Returns:
             an array of the next generation.
         '''
-        next_generation = list()
+        num_breeders = len(breeders)
+        num_children = self.pop_size - num_breeders
 
         if strategy == RANDOM:
-            while len(next_generation) < self.pop_size:
-                parent1, parent2 = random.sample(breeders, 2)
-                next_generation.append(parent1 * parent2)
+            parents1, parents2 = self._random_pairs(num_children, num_breeders)
         elif strategy == SPAN:
-            for i in range(len(breeders) // 2):
-                for child in range(self.num_children):
-                    parent1 = breeders[i]
-                    parent2 = breeders[len(breeders) - (i + 1)]
-                    next_generation.append(parent1 * parent2)
+            parents1 = numpy.repeat(
+                numpy.arange(num_breeders // 2), self.num_children
+            )
+            parents2 = num_breeders - 1 - parents1
 
             # Handle two cases where the generation might be off a little
-            while len(next_generation) < self.pop_size:
-                parent1, parent2 = random.sample(breeders, 2)
-                next_generation.append(parent1 * parent2)
-
-            next_generation = next_generation[:self.pop_size]
+            shortfall = num_children - len(parents1)
+            if shortfall > 0:
+                extra1, extra2 = self._random_pairs(shortfall, num_breeders)
+                parents1 = numpy.concatenate([parents1, extra1])
+                parents2 = numpy.concatenate([parents2, extra2])
+
+            parents1 = parents1[:num_children]
+            parents2 = parents2[:num_children]
         else:
             raise BreedError(f"Unsupported breeding strategy: {strategy}")
 
+        pairs = numpy.stack([parents1, parents2], axis=1)
+        next_generation = list(breeders)
+        next_generation.extend(Painting.crossover_batch(breeders, pairs))
+
         self.population = next_generation
         self.generation += 1
         return next_generation
@@ -4,7 +4,7 @@ Joy of Painting
 Usage:
     jop.py
     jop.py [-h | --help]
-    jop.py [-s START -e END --strokes STROKES --popsize POPSIZE --generations GENERATIONS --mutation CHANCE --fit PERCENT --lucky PERCENT]
+    jop.py [-s START -e END --strokes STROKES --popsize POPSIZE --generations GENERATIONS --mutation CHANCE --fit PERCENT --lucky PERCENT --workers WORKERS]
 
 Options:
     -h --help             Show this message.
@@ -16,21 +16,20 @@ Options:
     --mutation <chance>   The mutation chance each generation [default: .1]
     --fit <percent>       Percentage (decimal) to select [default: .2]
     --lucky <percent>     Percentage to select by luck [default: .05]
+    --workers <workers>   Number of scoring processes; 0 uses every core [default: 0]
 '''
 
-from operator import itemgetter
 import os
-import shutil
 
 from docopt import docopt
 
 import genetics
-import secrets
+import jop_secrets
 from jopclient import JoyOfPainting
 
 
 local_client = JoyOfPainting('local', local=True)
-jop_client = JoyOfPainting(secrets.APIKEY)
+jop_client = JoyOfPainting(jop_secrets.APIKEY)
 
 
 def score_painting(world, gen_id, painting):
@@ -40,44 +39,31 @@ def score_painting(world, gen_id, painting):
     )
 
 
-def save_best(ref, gen_id, generation):
+def save_best(ref, painting, generation, size):
     '''
     Saves the best painting for each generation.
 
     Args:
         ref: the gallery reference ID of the painting.
-        gen_id: the generation ID of the reproduction.
+        painting: the best Painting of the generation.
         generation: the generation number.
+        size: the (x, y) size of the reference image.
     '''
-    created_dir = "images/created/"
     progression_dir = "images/progression/"
     try:
         os.makedirs(f"{progression_dir}{ref}")
     except FileExistsError:
         pass
     finally:
-        shutil.copyfile(
-            f"{created_dir}{ref}-{gen_id}.png",
+        local_client.render(painting, size).save(
             f"{progression_dir}{ref}/{generation}.png"
         )
 
 
-def cleanup():
-    '''Cleans up all the generated images and json files.'''
-    created_dir = "images/created/"
-    for filename in os.listdir(created_dir):
-        if filename.endswith('png'):
-            os.remove(f"{created_dir}{filename}")
-
-    json_dir = "images/json/"
-    for filename in os.listdir(json_dir):
-        if filename.endswith('json'):
-            os.remove(f"{json_dir}{filename}")
-
-
 def happy_little_accidents(
     start=0, end=200, num_strokes=500, pop_size=1000, generations=100,
-    mutation_chance=.1, fit_percentage=.02, lucky_percentage=.05
+    mutation_chance=.1, fit_percentage=.02, lucky_percentage=.05,
+    max_workers=None
 ):
     '''
     Attempts to recreate all of the paintings in the gallery using a
@@ -98,6 +84,8 @@ def happy_little_accidents(
             Default is .2 (20%).
         lucky_percentage: percentage of non-top scoring paintings to
             select, if they're lucky enough. Default is .05 (5%).
+        max_workers: how many processes to score paintings with. Use 1
+            to score in-process; None uses every core. Default is None.
 
     Returns:
         A genetics.ScoredPainting named tuple, (score, painting, gen_id)
@@ -119,37 +107,41 @@ def happy_little_accidents(
         ref = image['id']
         image_file = local_client.get_image(ref)
 
-        print(f"Beginning SCIENCE on {ref}!")
-        world = genetics.GeneticPainting(
-            ref, image_file, num_strokes=num_strokes, pop_size=pop_size,
-            mutation_chance=mutation_chance, fit_percentage=fit_percentage,
-            lucky_percentage=lucky_percentage,
-        )
-        world.create_population()
+        # Decode the reference once and park it in shared memory, so
+        # scoring workers map it instead of re-decoding the PNG.
+        local_client.share_reference(ref)
 
-        generation = 0
-        scored = world.score_population(score_painting)
-        best = max(scored, key=itemgetter(0))
-        save_best(ref, best.gen_id, generation)
-
-        for generation in range(1, generations):
-            survivors = world.cull_the_herd(
-                scored, strategy=genetics.SURVIVORS
-            )
-            world.breed(survivors)
-            world.mutate()
-
-            scored = world.score_population(score_painting)
-            best = max(scored, key=itemgetter(0))
-            save_best(ref, best.gen_id, generation)
-            print(
-                f"Generation {world.generation}'s best: "
-                f"{best.score} by #{best.gen_id}"
+        print(f"Beginning SCIENCE on {ref}!")
+        try:
+            world = genetics.GeneticPainting(
+                ref, image_file, num_strokes=num_strokes, pop_size=pop_size,
+                mutation_chance=mutation_chance, fit_percentage=fit_percentage,
+                lucky_percentage=lucky_percentage, max_workers=max_workers,
             )
-
-        # Painting submission is now closed.
-        # jop_client.paint(ref, best.painting)
-        cleanup()
+            world.create_population()
+
+            generation = 0
+            scored, best = world.score_and_best(score_painting)
+            save_best(ref, best.painting, generation, world.image.size)
+
+            for generation in range(1, generations):
+                survivors = world.cull_the_herd(
+                    scored, strategy=genetics.SURVIVORS
+                )
+                world.breed(survivors)
+                world.mutate()
+
+                scored, best = world.score_and_best(score_painting)
+                save_best(ref, best.painting, generation, world.image.size)
+                print(
+                    f"Generation {world.generation}'s best: "
+                    f"{best.score} by #{best.gen_id}"
+                )
+
+            # Painting submission is now closed.
+            # jop_client.paint(ref, best.painting)
+        finally:
+            local_client.release_reference(ref)
     return best
 
 
@@ -165,4 +157,5 @@ if __name__ == '__main__':
         mutation_chance=float(args['--mutation']),
         fit_percentage=float(args['--fit']),
         lucky_percentage=float(args['--lucky']),
+        max_workers=int(args['--workers']) or None,
     )
@@ -1,12 +1,12 @@
 from io import BytesIO
-import json
+from multiprocessing import shared_memory
 import os
-import subprocess
 
-from PIL import Image
+import numpy
+from PIL import Image, ImageDraw
 from requests import sessions
 
-import secrets
+import jop_secrets
 
 
 class JoyOfPaintingException(Exception):
@@ -27,9 +27,11 @@ class JoyOfPainting(object):
 
     def __init__(self, key, local=False):
         self.local = local
-        self.base_url = secrets.JOP_URL
+        self.base_url = jop_secrets.JOP_URL
         self.session = sessions.Session()
         self.session.headers.update({'ApiKey': key})
+        self._reference_arrays = {}
+        self._shared_references = {}
 
     def _check_response(self, resp):
         if resp.status_code >= 400:
@@ -85,6 +87,96 @@ class JoyOfPainting(object):
 
         return Image.open(image_f)
 
+    def _reference_array(self, ref):
+        '''Decode the reference image once per ref and cache it.'''
+        if ref not in self._reference_arrays:
+            self._reference_arrays[ref] = numpy.asarray(
+                Image.open(f'images/reference/{ref}.png').convert('RGB'),
+                dtype=numpy.int16,
+            )
+
+        return self._reference_arrays[ref]
+
+    def share_reference(self, ref):
+        '''
+        Copy the decoded reference image into shared memory, so scoring
+        worker processes map the one decoded copy instead of each
+        re-decoding the PNG. Forked workers inherit the mapping
+        automatically; spawned ones can use attach_reference.
+
+        Args:
+            ref: the reference ID of the image.
+
+        Returns:
+            a (name, shape, dtype) descriptor for attach_reference.
+        '''
+        array = self._reference_array(ref)
+        block = shared_memory.SharedMemory(create=True, size=array.nbytes)
+        shared = numpy.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        shared[:] = array
+
+        self._shared_references[ref] = block
+        self._reference_arrays[ref] = shared
+
+        return block.name, array.shape, array.dtype.str
+
+    def attach_reference(self, ref, descriptor):
+        '''
+        Map a reference image that another process placed in shared
+        memory with share_reference.
+
+        Args:
+            ref: the reference ID of the image.
+            descriptor: the (name, shape, dtype) tuple returned by
+                share_reference.
+        '''
+        name, shape, dtype = descriptor
+        block = shared_memory.SharedMemory(name=name)
+
+        self._shared_references[ref] = block
+        self._reference_arrays[ref] = numpy.ndarray(
+            shape, dtype=dtype, buffer=block.buf
+        )
+
+    def release_reference(self, ref, unlink=True):
+        '''
+        Drop a reference image's cache entry and free its shared
+        memory, if it had any.
+
+        Args:
+            ref: the reference ID of the image.
+            unlink: whether to destroy the shared block outright;
+                only the process that created it should. Default is
+                True.
+        '''
+        self._reference_arrays.pop(ref, None)
+        block = self._shared_references.pop(ref, None)
+        if block is not None:
+            block.close()
+            if unlink:
+                block.unlink()
+
+    def render(self, painting, size=(500, 500)):
+        '''
+        Rasterize a painting in-process.
+
+        Args:
+            painting: the Painting object to rasterize.
+            size: the (x, y) size of the painting. Default is (500, 500)
+
+        Returns:
+            PIL.Image object of the finished painting.
+        '''
+        image = Image.new('RGB', size, tuple(painting.canvas))
+        draw = ImageDraw.Draw(image)
+        for (sx, sy), (ex, ey), color, brush in zip(
+            painting.starts.tolist(), painting.ends.tolist(),
+            painting.stroke_colors.tolist(), painting.brush_sizes.tolist(),
+        ):
+            draw.line([(sx, sy), (ex, ey)], fill=tuple(color), width=brush)
+
+        return image
+
     def paint(self, ref, painting, size=(500, 500), gen_id=''):
         '''
         Submit a painting!
@@ -107,38 +199,19 @@ class JoyOfPainting(object):
                 }
             size: the (x, y) size of the painting. Only needed for local
                 painting evaluation. Default is (500, 500)
-            gen_id: an optional generation ID for this painting, to save
-                many attempts of the same reference. Default is ''.
+            gen_id: an optional generation ID for this painting.
+                Default is ''.
 
         Returns:
             the score of the painting.
         '''
         if self.local:
-            filename = f"{ref}{f'-{gen_id}' if gen_id else ''}"
-            json_filepath = f"images/json/{filename}.json"
-            recreation_filepath = f"images/created/{filename}.png"
-
-            with open(json_filepath, 'w+') as jsonfile:
-                jsonfile.write(json.dumps(painting.to_json()))
-
-            subprocess.run(
-                [
-                    "local/create-painting",
-                    f"{size[0]}x{size[1]}",
-                    json_filepath,
-                    recreation_filepath
-                ]
+            recreation = numpy.asarray(
+                self.render(painting, size), dtype=numpy.int16
             )
-            creation = subprocess.run(
-                [
-                    "local/evaluate-painting",
-                    f"images/reference/{ref}.png",
-                    recreation_filepath
-                ],
-                stdout=subprocess.PIPE
-            )
-
-            score = float(creation.stdout)
+            score = float(-numpy.mean(
+                numpy.abs(recreation - self._reference_array(ref))
+            ))
         else:
             path = f'/gallery/{ref}/reproduction'
             paint_response = self.session.post(
@@ -1,40 +1,125 @@
 from collections import namedtuple
 import random
 
+import numpy
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional; crossover falls back to plain NumPy without it.
+    njit = None
 
-Color = namedtuple('Color', ['r', 'g', 'b'])
 
+Color = namedtuple('Color', ['r', 'g', 'b'])
 
-# Use Vectors to handle figuring out the stroke directions
-class Vector(object):
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
 
-    def __add__(self, other):
-        if not isinstance(other, Vector):
-            raise TypeError("can only add two Vectors.")
-        return Vector(self.x + other.x, self.y + other.y)
+if njit is not None:
+    @njit(cache=True)
+    def _crossover(
+        a_starts, b_starts, a_ends, b_ends, a_colors, b_colors,
+        a_brushes, b_brushes, mask,
+        out_starts, out_ends, out_colors, out_brushes,
+    ):
+        for i in range(mask.shape[0]):
+            if mask[i]:
+                out_starts[i] = a_starts[i]
+                out_ends[i] = a_ends[i]
+                out_colors[i] = a_colors[i]
+                out_brushes[i] = a_brushes[i]
+            else:
+                out_starts[i] = b_starts[i]
+                out_ends[i] = b_ends[i]
+                out_colors[i] = b_colors[i]
+                out_brushes[i] = b_brushes[i]
 
-    def __repr__(self):
-        return f"({self.x}, {self.y})"
+    # No parallel=True here: numba's default threading layer is not
+    # fork-safe, and this kernel runs interleaved with the fork-based
+    # scoring pools. The gather is memcpy-bound anyway.
+    @njit(cache=True)
+    def _crossover_batch(
+        a_starts, b_starts, a_ends, b_ends, a_colors, b_colors,
+        a_brushes, b_brushes, mask,
+        out_starts, out_ends, out_colors, out_brushes,
+    ):
+        for j in range(mask.shape[0]):
+            for i in range(mask.shape[1]):
+                if mask[j, i]:
+                    out_starts[j, i] = a_starts[j, i]
+                    out_ends[j, i] = a_ends[j, i]
+                    out_colors[j, i] = a_colors[j, i]
+                    out_brushes[j, i] = a_brushes[j, i]
+                else:
+                    out_starts[j, i] = b_starts[j, i]
+                    out_ends[j, i] = b_ends[j, i]
+                    out_colors[j, i] = b_colors[j, i]
+                    out_brushes[j, i] = b_brushes[j, i]
+else:
+    _crossover = None
+    _crossover_batch = None
 
-    def scale(self, n):
-        return Vector(self.x * n, self.y * n)
 
+# Vector only survives in the Stroke compatibility views; the stroke
+# direction arithmetic happens on whole arrays now.
+Vector = namedtuple('Vector', ['x', 'y'])
 
-HORIZONTAL, VERTICAL = Vector(1, 0), Vector(0, 1),
-RANDOM = 'random'
+HORIZONTAL, VERTICAL, RANDOM = 'horizontal', 'vertical', 'random'
 
 
 class Painting(object):
-    '''A representation of a masterpiece!'''
+    '''
+    A representation of a masterpiece!
+
+    Strokes are stored struct-of-arrays style, one NumPy array per
+    field, so crossover and mutation are single vectorized operations
+    instead of per-stroke Python loops:
+
+        starts: (N, 2) int16 x,y coordinates of each stroke's start.
+        ends: (N, 2) int16 x,y coordinates of each stroke's end.
+        colors: (N,) uint8 indexes into the palette.
+        brush_sizes: (N,) uint8 brush size of each stroke.
+        palette: (P, 3) uint8 r,g,b table the colors index into,
+            shared by every painting of the same reference.
+    '''
 
-    def __init__(self, ref, canvas, strokes):
+    def __init__(self, ref, canvas, starts, ends, colors, brush_sizes,
+                 palette):
         self.ref = ref
         self.canvas = canvas
-        self.num_strokes = len(strokes)
-        self.strokes = strokes
+        self.starts = starts
+        self.ends = ends
+        self.colors = colors
+        self.brush_sizes = brush_sizes
+        self.palette = palette
+        self.num_strokes = len(brush_sizes)
+        self._hash = None
+
+    @property
+    def stroke_colors(self):
+        '''The strokes' r,g,b colors, dereferenced from the palette.'''
+        return self.palette[self.colors]
+
+    @property
+    def strokes(self):
+        '''The strokes as Stroke objects, for compatibility.'''
+        return [
+            Stroke(Color(*color), brush, Vector(sx, sy), Vector(ex, ey))
+            for (sx, sy), (ex, ey), color, brush in zip(
+                self.starts.tolist(), self.ends.tolist(),
+                self.stroke_colors.tolist(), self.brush_sizes.tolist(),
+            )
+        ]
+
+    def __hash__(self):
+        '''
+        Hash the painting by its stroke arrays, lazily. Anything that
+        changes the arrays in-place must reset self._hash to None.
+        '''
+        if self._hash is None:
+            self._hash = hash((
+                self.starts.tobytes(), self.ends.tobytes(),
+                self.colors.tobytes(), self.brush_sizes.tobytes(),
+            ))
+        return self._hash
 
     def __mul__(self, other):
         '''
@@ -43,31 +128,122 @@ class Painting(object):
         '''
         canvas = random.choice([self.canvas, other.canvas])
 
-        strokes = []
-        for i in range(self.num_strokes):
-            strokes.append(random.choice([self, other]).strokes[i])
+        mask = numpy.random.random(self.num_strokes) < .5
+        if _crossover is not None:
+            starts = numpy.empty_like(self.starts)
+            ends = numpy.empty_like(self.ends)
+            colors = numpy.empty_like(self.colors)
+            brush_sizes = numpy.empty_like(self.brush_sizes)
+            _crossover(
+                self.starts, other.starts, self.ends, other.ends,
+                self.colors, other.colors,
+                self.brush_sizes, other.brush_sizes, mask,
+                starts, ends, colors, brush_sizes,
+            )
+            return Painting(
+                self.ref, canvas, starts, ends, colors, brush_sizes,
+                self.palette,
+            )
+
+        return Painting(
+            self.ref, canvas,
+            numpy.where(mask[:, None], self.starts, other.starts),
+            numpy.where(mask[:, None], self.ends, other.ends),
+            numpy.where(mask, self.colors, other.colors),
+            numpy.where(mask, self.brush_sizes, other.brush_sizes),
+            self.palette,
+        )
+
+    @classmethod
+    def crossover_batch(cls, breeders, pairs):
+        '''
+        Breed many pairs of paintings in one vectorized crossover,
+        instead of one __mul__ call per child.
+
+        Args:
+            breeders: an array of Paintings of the same reference (so
+                they share num_strokes and palette).
+            pairs: a (K, 2) array of parent indexes into breeders.
+
+        Returns:
+            an array of the K child Paintings.
+        '''
+        starts = numpy.stack([painting.starts for painting in breeders])
+        ends = numpy.stack([painting.ends for painting in breeders])
+        colors = numpy.stack([painting.colors for painting in breeders])
+        brushes = numpy.stack([painting.brush_sizes for painting in breeders])
+
+        parents1, parents2 = pairs[:, 0], pairs[:, 1]
+        mask = numpy.random.random((len(pairs), starts.shape[1])) < .5
+
+        if _crossover_batch is not None:
+            out_starts = numpy.empty_like(starts[parents1])
+            out_ends = numpy.empty_like(ends[parents1])
+            out_colors = numpy.empty_like(colors[parents1])
+            out_brushes = numpy.empty_like(brushes[parents1])
+            _crossover_batch(
+                starts[parents1], starts[parents2],
+                ends[parents1], ends[parents2],
+                colors[parents1], colors[parents2],
+                brushes[parents1], brushes[parents2], mask,
+                out_starts, out_ends, out_colors, out_brushes,
+            )
+        else:
+            out_starts = numpy.where(
+                mask[:, :, None], starts[parents1], starts[parents2]
+            )
+            out_ends = numpy.where(
+                mask[:, :, None], ends[parents1], ends[parents2]
+            )
+            out_colors = numpy.where(mask, colors[parents1], colors[parents2])
+            out_brushes = numpy.where(
+                mask, brushes[parents1], brushes[parents2]
+            )
+
+        coin = numpy.random.random(len(pairs)) < .5
+        template = breeders[0]
+        return [
+            cls(
+                template.ref,
+                breeders[parents1[j] if coin[j] else parents2[j]].canvas,
+                out_starts[j], out_ends[j], out_colors[j], out_brushes[j],
+                template.palette,
+            )
+            for j in range(len(pairs))
+        ]
 
-        return Painting(self.ref, canvas, strokes)
+    def shuffle_strokes(self):
+        '''
+        Reorder the strokes in-place, applying one random permutation
+        across all four stroke arrays.
+        '''
+        order = numpy.random.permutation(self.num_strokes)
+        self.starts = self.starts[order]
+        self.ends = self.ends[order]
+        self.colors = self.colors[order]
+        self.brush_sizes = self.brush_sizes[order]
+        self._hash = None
 
     @classmethod
-    def generate(cls, ref, image, color_generator, canvas, num_strokes):
+    def generate(cls, ref, image, color_generator, canvas, num_strokes,
+                 palette):
         '''
         Generate a new random painting!
 
         Args:
             ref: the ref ID of the image.
             image: the PIL.Image representation of the image file.
-            color_generator: a generator with .next() implemented, to give
-                a weighted random color.
+            color_generator: a generator with .next_batch() implemented,
+                to give weighted random palette indexes.
             canvas: the canvas color.
             num_strokes: how many strokes the painting should have.
+            palette: the (P, 3) color table the indexes refer to.
 
         Returns:
             a new Painting with a random set of strokes.
         '''
         strategy = random.choice([HORIZONTAL, VERTICAL, RANDOM])
-        rgb = canvas[:3]
-        canvas = Color(*rgb)
+        canvas = Color(*canvas)
         brush_size = random.randint(2, 12)
         distance = random.randint(5, 200)
         w, h = image.size
@@ -87,42 +263,63 @@ class Painting(object):
         elif strategy == RANDOM:
             stroke_length = random.randint(0, int((w**2 + h**2)**.5))
 
-        strokes = []
-        for i in range(num_strokes):
-            if strategy == HORIZONTAL:
-                move_x = i % strokes_per_line
-                move_y = i // strokes_per_line
-                start = Vector(
-                    move_x * stroke_length + brush_size * (2 * move_x + 1),
-                    brush_size * (2 * move_y + 1)
-                )
-                end = start + strategy.scale(stroke_length)
-            elif strategy == VERTICAL:
-                move_x = i // strokes_per_line
-                move_y = i % strokes_per_line
-                start = Vector(
-                    brush_size * (2 * move_x + 1),
-                    move_y * stroke_length + brush_size * (2 * move_y + 1)
-                )
-                end = start + strategy.scale(stroke_length)
-            elif strategy == RANDOM:
-                start = Vector(random.randint(0, w), random.randint(0, h))
-                rand_x = random.randint(start.x - distance, start.x + distance)
-                rand_y = random.randint(start.y - distance, start.y + distance)
-                end = Vector(min(rand_x, w), min(rand_y, h))
+        i = numpy.arange(num_strokes)
+        if strategy == HORIZONTAL:
+            move_x = i % strokes_per_line
+            move_y = i // strokes_per_line
+            start_x = move_x * stroke_length + brush_size * (2 * move_x + 1)
+            start_y = brush_size * (2 * move_y + 1)
+            end_x = start_x + stroke_length
+            end_y = start_y
+        elif strategy == VERTICAL:
+            move_x = i // strokes_per_line
+            move_y = i % strokes_per_line
+            start_x = brush_size * (2 * move_x + 1)
+            start_y = move_y * stroke_length + brush_size * (2 * move_y + 1)
+            end_x = start_x
+            end_y = start_y + stroke_length
+        elif strategy == RANDOM:
+            start_x = numpy.random.randint(0, w + 1, num_strokes)
+            start_y = numpy.random.randint(0, h + 1, num_strokes)
+            end_x = numpy.minimum(
+                start_x + numpy.random.randint(
+                    -distance, distance + 1, num_strokes
+                ),
+                w,
+            )
+            end_y = numpy.minimum(
+                start_y + numpy.random.randint(
+                    -distance, distance + 1, num_strokes
+                ),
+                h,
+            )
 
-            rgb = color_generator.next()[:3]
-            color = Color(*rgb)
-            strokes.append(Stroke(color, brush_size, start, end))
+        starts = numpy.stack([start_x, start_y], axis=1).astype(numpy.int16)
+        ends = numpy.stack([end_x, end_y], axis=1).astype(numpy.int16)
+        colors = color_generator.next_batch(num_strokes)
+        brush_sizes = numpy.full(num_strokes, brush_size, dtype=numpy.uint8)
 
-        return Painting(ref, canvas, strokes)
+        return Painting(
+            ref, canvas, starts, ends, colors, brush_sizes, palette
+        )
 
     def to_json(self):
         r, g, b = self.canvas
 
         return {
             'canvasColor': {'r': r, 'g': g, 'b': b},
-            'strokes': [stroke.to_json() for stroke in self.strokes]
+            'strokes': [
+                {
+                    'color': {'r': cr, 'g': cg, 'b': cb},
+                    'start': {'x': sx, 'y': sy},
+                    'end': {'x': ex, 'y': ey},
+                    'brushSize': brush
+                }
+                for (sx, sy), (ex, ey), (cr, cg, cb), brush in zip(
+                    self.starts.tolist(), self.ends.tolist(),
+                    self.stroke_colors.tolist(), self.brush_sizes.tolist(),
+                )
+            ]
         }
 
 
@@ -1,5 +1,4 @@
-import bisect
-import random
+import numpy
 
 
 class WeightedRandomColors(object):
@@ -7,23 +6,75 @@ class WeightedRandomColors(object):
     Adapted from https://eli.thegreenplace.net/2010/01/22/
     weighted-random-generation-in-python/
 
-    Used to create a weight system to get random colors quickly.
+    Used to create a weight system to get random colors quickly. The
+    "colors" can be full r,g,b rows or scalar palette indices; draws
+    return whichever shape went in.
     '''
 
+    CHUNK_SIZE = 4096
+
     def __init__(self, color_weights):
-        self.totals = []
-        self.colors = []
-        running_total = 0
+        colors = []
+        weights = []
 
         for color, weight in color_weights:
-            running_total += weight
-            self.totals.append(running_total)
-            self.colors.append(color)
+            colors.append(color)
+            weights.append(weight)
+
+        self.colors = numpy.asarray(colors, dtype=numpy.uint8)
+        if self.colors.ndim > 1:
+            # Trim to r,g,b up front so callers never have to re-slice
+            # alpha off each draw.
+            self.colors = self.colors[:, :3]
+        self._build_alias_tables(numpy.asarray(weights, dtype=numpy.float64))
+        self._cache = self.colors[:0]
+        self._cache_used = 0
+
+    def _build_alias_tables(self, weights):
+        '''
+        Build Walker's alias tables with Vose's algorithm, so each draw
+        is one uniform index plus one biased coin flip: O(1) instead of
+        a binary search through the running totals.
+        '''
+        n = len(weights)
+        scaled = weights * (n / weights.sum())
+        self.prob = numpy.ones(n, dtype=numpy.float64)
+        self.alias = numpy.arange(n, dtype=numpy.intp)
+
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            lo, hi = small.pop(), large.pop()
+            self.prob[lo] = scaled[lo]
+            self.alias[lo] = hi
+            scaled[hi] -= 1.0 - scaled[lo]
+            if scaled[hi] < 1.0:
+                small.append(hi)
+            else:
+                large.append(hi)
+
+    def next_batch(self, k):
+        '''
+        Pick k weighted random colors in one vectorized draw.
+
+        Args:
+            k: how many colors to pick.
+
+        Returns:
+            a (k, channels) numpy array of colors.
+        '''
+        indices = numpy.random.randint(0, len(self.prob), k)
+        coin = numpy.random.random(k) < self.prob[indices]
+        return self.colors[numpy.where(coin, indices, self.alias[indices])]
 
     def next(self):
-        rnd = random.random() * self.totals[-1]
-        ind = bisect.bisect_right(self.totals, rnd)
-        return self.colors[ind]
+        if self._cache_used >= len(self._cache):
+            self._cache = self.next_batch(self.CHUNK_SIZE)
+            self._cache_used = 0
+
+        color = self._cache[self._cache_used]
+        self._cache_used += 1
+        return color
 
     def __call__(self):
         return self.next()